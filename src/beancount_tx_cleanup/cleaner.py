@@ -1,31 +1,285 @@
 """A function that cleans up the payee field and adds discovered information to entry's metadata."""
 
 import datetime
+import functools
+import multiprocessing
 import re
+import sys
 from abc import ABC, abstractmethod
-from collections.abc import Callable, Iterable
-from typing import TypeAlias
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+from dataclasses import FrozenInstanceError, dataclass, field, fields
+from itertools import groupby, takewhile
+from typing import Any, NoReturn, TypeAlias
 
 from beancount.core.data import Transaction
-from pydantic import BaseModel
 from typing_extensions import override
 
+__all__ = [
+    'AGES_AGO',
+    'BATCH_CHUNK_SIZE',
+    'EXTRACTION_CACHE_SIZE',
+    'Action',
+    'C',
+    'E',
+    'Extraction',
+    'Extractor',
+    'ExtractorUsage',
+    'Extractors',
+    'ExtractorsUsage',
+    'M',
+    'Meta',
+    'P',
+    'Payee',
+    'Replacement',
+    'T',
+    'Tag',
+    'TxnPayeeCleanup',
+    'TxnPayeeCleanupBatch',
+    'TxnState',
+    'extractorsUsage',
+]
+
 AGES_AGO = datetime.date(1900, 1, 1)
+# how many payees an Extractors list remembers the results for
+EXTRACTION_CACHE_SIZE = 4096
+# the smallest share of a batch worth handing over to a worker process; the
+# pool takes ~20ms to start, and sending the cleaned transactions back costs
+# about as much as cleaning them
+BATCH_CHUNK_SIZE = 5000
 Replacement: TypeAlias = str | Callable[[re.Match], str]
 
+# global inline flags, which python only accepts at the start of a pattern
+_GLOBAL_FLAGS = re.compile(r'^(?:\(\?[aiLmsux]+\))+')
+_SCOPED_FLAGS = {
+    re.ASCII: 'a',
+    re.IGNORECASE: 'i',
+    re.MULTILINE: 'm',
+    re.DOTALL: 's',
+    re.VERBOSE: 'x',
+}
+# numbered backreferences and conditionals - these would break once the
+# groups of a pattern get renumbered by combining it with other patterns
+_GROUP_REFERENCES = re.compile(r'\\[1-9]|\(\?P=|\(\?\(')
+# replacement templates made of a single group reference, like \1 or \g<id>
+_GROUP_TEMPLATE = re.compile(r'\\(?:([1-9][0-9]?)|g<(\w+)>)')
+# the parser behind re is private and may change or go away; the patterns
+# are only analysed for hints, which are all optional - if that fails, there
+# just aren't any
+_constants: Any
+_parser: Any
+try:
+    from re import _constants, _parser  # pyright: ignore[reportAttributeAccessIssue]
+
+    # what ^ and \A parse to, when they're not in MULTILINE mode
+    _STRING_START = (
+        (_constants.AT, _constants.AT_BEGINNING),
+        (_constants.AT, _constants.AT_BEGINNING_STRING),
+    )
+except (ImportError, AttributeError):  # pragma: no cover
+    # using these fails, and the patterns get no hints
+    _constants = _parser = None
+    _STRING_START = ()
+
+
+@functools.lru_cache(maxsize=32)
+def _union(patterns: tuple[re.Pattern, ...]) -> re.Pattern | None:
+    """Combine patterns into one that matches wherever any of them matches.
+
+    Returns None if there are no patterns, or if they can't be combined
+    without changing what they match. Patterns compare by their source and
+    flags, so equal sets of extractors share the result.
+    """
+    alternatives = []
+    for r in patterns:
+        if _GROUP_REFERENCES.search(r.pattern):
+            return None
+        flags = ''.join(
+            f for flag, f in _SCOPED_FLAGS.items() if r.flags & flag
+        )
+        body = _GLOBAL_FLAGS.sub('', r.pattern)
+        if r.flags & re.VERBOSE:
+            # don't let a trailing comment swallow the closing parenthesis
+            body += '\n'
+        alternatives.append(f'(?{flags}:{body})')
+    if not alternatives:
+        return None
+    try:
+        return re.compile('|'.join(alternatives))
+    except re.error:
+        return None
+
+
+def _chars(items: Iterable[tuple[Any, Any]]) -> Iterator[str]:
+    """Flatten a parsed pattern into its literal characters, '' for anything else."""
+    for op, av in items:
+        if op is _constants.LITERAL:
+            yield chr(av)
+        elif op is _constants.SUBPATTERN and not av[1] & re.IGNORECASE:
+            # av is (group, add_flags, del_flags, items)
+            yield from _chars(av[3])
+        else:
+            yield ''
+
+
+def _fixed_strings(r: re.Pattern) -> tuple[str | None, str | None]:
+    """Find the fixed strings in r.
+
+    Returns the longest string every match of r contains, and the string r
+    matches if that's all it ever matches.
+    """
+    if r.flags & re.IGNORECASE:
+        return None, None
+    try:
+        chars = list(_chars(_parser.parse(r.pattern, r.flags)))
+    except Exception:  # noqa: BLE001
+        return None, None
+    runs = [''.join(g) for fixed, g in groupby(chars, bool) if fixed]
+    required = max(runs, key=len, default='') or None
+    return required, required if '' not in chars else None
+
+
+def _prefix(r: re.Pattern) -> str | None:
+    """Find the fixed string r only ever matches at the start of a string.
+
+    Returns '' if r is anchored to the start but doesn't begin with a fixed
+    string, None if it isn't anchored.
+    """
+    if r.flags & re.MULTILINE:
+        return None
+    try:
+        items = list(_parser.parse(r.pattern, r.flags))
+        if not items or items[0] not in _STRING_START:
+            return None
+        if r.flags & re.IGNORECASE:
+            return ''
+        return ''.join(takewhile(bool, _chars(items[1:])))
+    except Exception:  # noqa: BLE001
+        return None
+
+
+def _min_width(r: re.Pattern) -> int:
+    """Tell how many characters every match of r spans at least."""
+    try:
+        return _parser.parse(r.pattern, r.flags).getwidth()[0]
+    except Exception:  # noqa: BLE001
+        return 0
+
+
+class _Translation(dict[str, str]):
+    """A translation table shared by Actions, which can't be changed.
+
+    Unlike a MappingProxyType, it can be pickled, and its lookups stay as fast
+    as those of a dict.
+    """
+
+    def _readonly(self, *_args: Any, **_kwargs: Any) -> NoReturn:
+        raise TypeError('translation tables are read-only')
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly  # pyright: ignore[reportAssignmentType]
+
+    @override
+    def __reduce__(self) -> tuple[type['_Translation'], tuple[dict[str, str]]]:
+        return type(self), (dict(self),)
+
+
+@functools.lru_cache(maxsize=256)
+def _translation(items: frozenset[tuple[str, str]]) -> Mapping[str, str]:
+    """Build a translation table, once for each of the recently used ones."""
+    return _Translation(items)
+
+
+def _shared_translation(translation: Mapping[str, str]) -> Mapping[str, str]:
+    """Return a read-only copy of translation, shared by equal tables.
+
+    Keys are lowercased, as values are looked up by their lowercase form;
+    ValueError is raised for keys that differ only in case.
+    """
+    table: dict[str, str] = {}
+    for k, v in translation.items():
+        lower = k.lower()
+        if lower in table:
+            raise ValueError(f'translation keys differ only in case: {k!r}')
+        table[sys.intern(lower)] = sys.intern(v)
+    return _translation(frozenset(table.items()))
+
+
+def _identity(s: str) -> str:
+    return s
 
-class Action(BaseModel, ABC):
-    """Action describes an action that an Extractor can perform after it matches."""
+
+@dataclass(slots=True)
+class TxnState:
+    """The fields of a Transaction that Actions can change."""
+
+    payee: str
+    tags: set[str]
+    meta: dict[str, Any]
+
+    @classmethod
+    def of(cls, txn: Transaction) -> 'TxnState':
+        """Make a copy of txn's state that's safe to modify."""
+        return cls(txn.payee or '', set(txn.tags or ()), dict(txn.meta or {}))
+
+    def add_meta(self, n: str, v: str) -> None:
+        """Set metadata entry n to v, or append v to it if it's already set."""
+        if n in self.meta:
+            self.meta[n] += f', {v}'
+        else:
+            self.meta[n] = v
+
+    def replace(self, txn: Transaction) -> Transaction:
+        """Return txn with its fields replaced with this state."""
+        return txn._replace(
+            payee=self.payee,
+            tags=frozenset(self.tags),
+            meta=self.meta,
+        )
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class Action(ABC):
+    """Action describes an action that an Extractor can perform after it matches.
+
+    Actions are frozen, as the way to apply v is worked out when they're made.
+    """
 
     v: Replacement = r'\1'
-    transformer: Callable[[str], str] = lambda s: s
-    translation: dict[str, str] = {}
+    transformer: Callable[[str], str] = _identity
+    translation: Mapping[str, str] = field(default_factory=dict)
+    # Match.expand() parses the template on every call; the most common
+    # templates are worked out once here instead
+    _group: int | str | None = field(default=None, init=False, repr=False)
+    _literal: str | None = field(default=None, init=False, repr=False)
+
+    def __post_init__(self) -> None:  # noqa: D105
+        # frozen: the fields are set the way the generated __init__ does
+        translation = _shared_translation(self.translation)
+        object.__setattr__(self, 'translation', translation)
+        if not isinstance(self.v, str):
+            return
+        if g := _GROUP_TEMPLATE.fullmatch(self.v):
+            group = g[1] or g[2]
+            group = int(group) if group.isdigit() else group
+            object.__setattr__(self, '_group', group)
+        elif '\\' not in self.v:
+            object.__setattr__(self, '_literal', sys.intern(self.v))
 
     def apply(self, m: re.Match) -> str:
         """Work out the requested value out of matched data and transformations."""
-        v: str = m.expand(self.v).strip()
-        v = self.transformer(v)
-        return self.translation.get(v.lower(), v)
+        if self._group is not None:
+            v: str = m.group(self._group) or ''
+        elif self._literal is not None:
+            v = self._literal
+        else:
+            v = m.expand(self.v)
+        v = v.strip()
+        # most actions neither transform nor translate; skip the calls then
+        if self.transformer is not _identity:
+            v = self.transformer(v)
+        if translation := self.translation:
+            v = translation.get(v.lower(), v)
+        return v
 
     @classmethod
     def new(cls, v: Replacement, **kwargs) -> 'Action':
@@ -33,43 +287,80 @@ class Action(BaseModel, ABC):
         return cls(v=v, **kwargs)
 
     @abstractmethod
+    def update(self, m: re.Match, state: TxnState) -> None:
+        """Apply this action to state, using match data m."""
+        pass
+
     def execute(self, m: re.Match, txn: Transaction) -> Transaction:
         """Apply this action to txn, using match data m."""
-        pass
+        state = TxnState.of(txn)
+        self.update(m, state)
+        return state.replace(txn)
 
 
+@dataclass(frozen=True, slots=True, kw_only=True)
 class Payee(Action):
     """Set payee field to the result of Action."""
 
     v: Replacement = ''
 
-    def execute(self, m: re.Match, txn: Transaction) -> Transaction:  # noqa: D102
-        p: str = m.re.sub(self.v, txn.payee).strip()
-        return txn._replace(payee=p)
+    def sub(
+        self,
+        r: re.Pattern,
+        payee: str,
+        literal: str | None = None,
+        count: int = 0,
+    ) -> tuple[str, int]:
+        """Rewrite every match of r in payee, report the number of matches.
+
+        If r matches a fixed string, pass it as literal to bypass regexps. If
+        r can only match once, pass count=1 to stop looking after that.
+        """
+        if literal and self._literal is not None:
+            n = payee.count(literal)
+            return payee.replace(literal, self._literal).strip(), n
+        p, n = r.subn(self.v, payee, count)
+        return p.strip(), n
+
+    def update(  # noqa: D102
+        self,
+        m: re.Match,
+        state: TxnState,
+        count: int = 0,
+    ) -> None:
+        if (
+            self._literal == ''
+            and m.string is state.payee
+            and m.span() == (0, len(m.string))
+        ):
+            # clearing a match of the whole payee leaves nothing to look for
+            state.payee = ''
+        else:
+            state.payee = self.sub(m.re, state.payee, count=count)[0]
 
 
+@dataclass(frozen=True, slots=True, kw_only=True)
 class Tag(Action):
     """Add a tag from Action."""
 
-    def execute(self, m: re.Match, txn: Transaction) -> Transaction:  # noqa: D102
-        tags = set(txn.tags or [])
-        tags.add(self.apply(m))
-        return txn._replace(tags=tags)
+    def update(self, m: re.Match, state: TxnState) -> None:  # noqa: D102
+        state.tags.add(self.apply(m))
 
 
+@dataclass(frozen=True, slots=True, kw_only=True)
 class Meta(Action):
     """Add a metadata entry from Action."""
 
     n: str
 
-    def execute(self, m: re.Match, txn: Transaction) -> Transaction:  # noqa: D102
-        meta = txn.meta or {}
-        v = self.apply(m)
-        if self.n in meta:
-            meta[self.n] += f', {v}'
-        else:
-            meta[self.n] = v
-        return txn._replace(meta=meta)
+    @override
+    def __post_init__(self) -> None:
+        # zero-argument super() doesn't work in slotted dataclasses before 3.14
+        Action.__post_init__(self)
+        object.__setattr__(self, 'n', sys.intern(self.n))
+
+    def update(self, m: re.Match, state: TxnState) -> None:  # noqa: D102
+        state.add_meta(self.n, self.apply(m))
 
     @classmethod
     @override
@@ -84,13 +375,89 @@ M = Meta.new
 C = Payee(v='')
 
 
-class Extractor(BaseModel):
-    """Apply regexp to payee, apply Actions."""
+@dataclass(slots=True, kw_only=True)
+class Extractor:
+    """Apply regexp to payee, apply Actions.
+
+    Everything but last_used is fixed once the extractor is created, since so
+    much is worked out from r and actions up front.
+    """
 
     r: re.Pattern
-    actions: list[Action] = []
+    actions: Sequence[Action] = ()
     last_used: datetime.date = AGES_AGO
     description: str = ''
+    # a fixed string every match of r contains, which is much cheaper to look
+    # for than running r; and the fixed string r matches, if that's all it does
+    _required: str | None = field(default=None, init=False, repr=False)
+    _literal: str | None = field(default=None, init=False, repr=False)
+    # the fixed string r's matches start the payee with, if they're anchored
+    _prefix: str | None = field(default=None, init=False, repr=False)
+    # how many matches of r there can be in a payee, 0 if there's no limit
+    _count: int = field(default=0, init=False, repr=False)
+    # the action, if it's a single Payee one - see apply()
+    _lone_payee: Payee | None = field(default=None, init=False, repr=False)
+    # bound once, rather than looked up on r for every payee
+    _search: Callable = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:  # noqa: D105
+        # accept pattern strings, the way pydantic did
+        if isinstance(self.r, str):
+            self.r = re.compile(self.r)
+        self.actions = tuple(self.actions)
+        self._required, self._literal = _fixed_strings(self.r)
+        prefix = _prefix(self.r)
+        self._prefix = prefix or None
+        # a match anchored at the start of a string can't be followed by more
+        self._count = 0 if prefix is None else 1
+        if len(self.actions) == 1 and isinstance(self.actions[0], Payee):
+            self._lone_payee = self.actions[0]
+        self._search = self.r.search
+
+    def __setattr__(self, name: str, value: Any) -> None:  # noqa: D105
+        # _search is the last thing __post_init__ sets
+        if name != 'last_used' and hasattr(self, '_search'):
+            raise FrozenInstanceError(f'cannot assign to field {name!r}')
+        object.__setattr__(self, name, value)
+
+    def __getstate__(self) -> dict[str, Any]:  # noqa: D105
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:  # noqa: D105
+        # bypassing __setattr__, which would refuse all but last_used
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+    @property
+    def required(self) -> str:
+        """A fixed string that every match of r contains, '' if there's none."""
+        return self._required or ''
+
+    def apply(self, state: TxnState, pos: int = 0) -> bool:
+        """Run the actions on state if r matches its payee, tell whether it did.
+
+        pos is where to start looking for a match, if it's known that there's
+        none before it.
+        """
+        payee = state.payee
+        if self._prefix is not None and not payee.startswith(self._prefix):
+            return False
+        if (action := self._lone_payee) is not None:
+            # a lone Payee action has no use for the match object, so finding
+            # and rewriting the payee can happen in a single pass
+            payee, n = action.sub(self.r, payee, self._literal, self._count)
+            if n:
+                state.payee = payee
+            return bool(n)
+        if m := self._search(payee, pos):
+            for action in self.actions:
+                if isinstance(action, Payee):
+                    # no need to look for more matches than there can be
+                    action.update(m, state, self._count)
+                else:
+                    action.update(m, state)
+            return True
+        return False
 
     @classmethod
     def new(  # noqa: D102
@@ -109,15 +476,193 @@ class Extractor(BaseModel):
 E = Extractor.new
 
 
+@dataclass(frozen=True, slots=True)
+class Extraction:
+    """Everything a set of extractors made out of a payee.
+
+    It doesn't depend on anything but the payee, which makes it reusable for
+    every transaction with the same payee - as long as transformers and
+    replacement functions of the actions depend only on their input, too.
+    """
+
+    payee: str
+    tags: frozenset[str] = frozenset()
+    meta: tuple[tuple[str, str], ...] = ()
+    # the extractors that matched
+    extractors: tuple[Extractor, ...] = ()
+
+    @classmethod
+    def of(
+        cls,
+        extractors: Iterable[Extractor],
+        payee: str,
+        required: Iterable[str] | None = None,
+        pos: int = 0,
+    ) -> 'Extraction':
+        """Run extractors on payee.
+
+        required holds the fixed string each of the extractors needs to find
+        in the payee ('' if none), taken from the extractors if not given;
+        checking these inline avoids calling into extractors that can't match.
+        pos is where the earliest match of any of the extractors can start in
+        payee.
+        """
+        state = TxnState(payee, set(), {})
+        if required is None:
+            extractors = list(extractors)
+            required = [e.required for e in extractors]
+        matched = tuple(
+            e
+            for e, s in zip(extractors, required, strict=False)
+            if s in state.payee
+            # once the payee gets rewritten, pos doesn't apply to it anymore
+            and e.apply(state, pos if state.payee is payee else 0)
+        )
+        return cls(
+            state.payee,
+            frozenset(state.tags),
+            tuple(state.meta.items()),
+            matched,
+        )
+
+    def update(self, state: TxnState) -> None:
+        """Apply the results to state, as if the extractors ran on it."""
+        state.payee = self.payee
+        state.tags.update(self.tags)
+        for n, v in self.meta:
+            state.add_meta(n, v)
+
+
+def _extract(
+    extractors: list[Extractor],
+    required: tuple[str, ...],
+    min_width: int,
+    union: re.Pattern | None,
+    payee: str,
+) -> Extraction:
+    if len(payee) < min_width:
+        return Extraction(payee)
+    pos = 0
+    if union is not None:
+        # no extractor can match before the union does
+        if (m := union.search(payee)) is None:
+            return Extraction(payee)
+        pos = m.start()
+    return Extraction.of(extractors, payee, required, pos)
+
+
 class Extractors(list[Extractor]):
     """A list of Extractor that can handle += operator."""
 
+    # derived from the extractors, see _refresh()
+    _snapshot: list[Extractor] | None
+    _union: re.Pattern | None
+    _min_width: int
+    _extract: Callable[[str], Extraction]
+
+    def __init__(self, iterable: Iterable[Extractor] = (), /) -> None:  # noqa: D107
+        super().__init__(iterable)
+        self._snapshot = None
+        self._refresh()
+
+    def _refresh(self) -> None:
+        """Rebuild everything derived from the extractors, if they changed."""
+        # the methods changing the list reset the snapshot, see below
+        if self._snapshot is None:
+            self._snapshot = list(self)
+            self._union = _union(tuple(e.r for e in self))
+            # payees shorter than this can't match any of the extractors
+            self._min_width = min((_min_width(e.r) for e in self), default=0)
+            # kept alongside the extractors, so that the ones which can't
+            # match get skipped without a method call
+            required = tuple(e.required for e in self)
+            self._extract = functools.lru_cache(EXTRACTION_CACHE_SIZE)(
+                functools.partial(
+                    _extract,
+                    self._snapshot,
+                    required,
+                    self._min_width,
+                    self._union,
+                ),
+            )
+
+    def precompile(self) -> None:
+        """Build the union and such now, rather than when first needed."""
+        self._refresh()
+
+    def union(self) -> re.Pattern | None:
+        """Return a pattern that matches wherever any of the extractors does.
+
+        The pattern is rebuilt whenever the contents of the list change. None
+        if the patterns can't be combined.
+        """
+        self._refresh()
+        return self._union
+
+    def extract(self, payee: str) -> Extraction:
+        """Run the extractors on payee, reusing results for recent payees."""
+        self._refresh()
+        return self._extract(payee)
+
     def __iadd__(self, e: Extractor | Iterable[Extractor], /) -> 'Extractors':
         """Handle += operator."""
         if isinstance(e, Extractor):
             e = [e]
+        self._snapshot = None
         return super().__iadd__(e)
 
+    @override
+    def __reduce__(self) -> tuple[type['Extractors'], tuple[list[Extractor]]]:
+        """Copy and pickle just the extractors, and derive the rest anew.
+
+        The cached results refer to the original extractors, which would have
+        their last_used updated by the copy otherwise.
+        """
+        return type(self), (list(self),)
+
+    @override
+    def copy(self) -> 'Extractors':
+        """Return a shallow copy, reusing the union and cached results.
+
+        list.copy() would return a plain list, which has neither.
+        """
+        self._refresh()
+        other = Extractors()
+        other.extend(self)
+        other._snapshot, other._union = self._snapshot, self._union
+        other._min_width, other._extract = self._min_width, self._extract
+        return other
+
+
+def _invalidating(method: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap a list method, so that it resets the snapshot of Extractors."""
+
+    @functools.wraps(method)
+    def wrapper(self: Extractors, /, *args: Any, **kwargs: Any) -> Any:
+        self._snapshot = None
+        return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+# checking the snapshot against the list on every call would cost as much as
+# a pass over the extractors; every change of the list goes through these
+for _name in (
+    '__setitem__',
+    '__delitem__',
+    '__imul__',
+    'append',
+    'extend',
+    'insert',
+    'pop',
+    'remove',
+    'clear',
+    'sort',
+    'reverse',
+):
+    setattr(Extractors, _name, _invalidating(getattr(list, _name)))
+del _name
+
 
 def TxnPayeeCleanup(
     txn: Transaction,
@@ -127,29 +672,92 @@ def TxnPayeeCleanup(
     """Extract extra information from the payee field of the Transaction."""
     if extractors is None or not txn.payee:
         return txn
-    old_payee = txn.payee
-    old_meta = txn.meta.copy()
-    for extractor in extractors:
-        if m := extractor.r.search(txn.payee):
-            # record the most recent timestamp this extractor applied to:
-            extractor.last_used = max(txn.date, extractor.last_used)
-            for action in extractor.actions:
-                txn = action.execute(m, txn)
-    if preserveOriginalIn and txn.payee != old_payee:
-        txn.meta[preserveOriginalIn] = old_payee
-    if txn.meta != old_meta:
-        txn = txn._replace(meta=dict(sorted(txn.meta.items())))  # pyright: ignore[reportCallIssue]
-    return txn
-
-
-class ExtractorUsage(BaseModel):
+    if isinstance(extractors, Extractors):
+        extraction = extractors.extract(txn.payee)
+    else:
+        extraction = Extraction.of(extractors, txn.payee)
+    if not extraction.extractors:
+        return txn
+    date = txn.date
+    for extractor in extraction.extractors:
+        # record the most recent timestamp this extractor applied to; most of
+        # the time it's already there, which saves going through __setattr__
+        if date > extractor.last_used:  # noqa: PLR1730
+            extractor.last_used = date
+    if not (extraction.tags or extraction.meta or preserveOriginalIn):
+        # only the payee changes; tags and meta can stay shared with txn
+        return txn._replace(payee=extraction.payee)
+    state = TxnState.of(txn)
+    extraction.update(state)
+    if preserveOriginalIn and state.payee != txn.payee:
+        state.meta[preserveOriginalIn] = txn.payee
+    # Meta actions only ever add keys or extend values of existing ones; keep
+    # the keys sorted, which only needs redoing if there are new ones
+    if len(state.meta) != len(txn.meta):
+        state.meta = dict(sorted(state.meta.items()))
+    return state.replace(txn)
+
+
+# what TxnPayeeCleanupBatch worker processes work with, set as they start
+_worker_args: tuple[Extractors | None, str | None] = (None, None)
+
+
+def _init_worker(extractors: Extractors, preserveOriginalIn: str | None):
+    global _worker_args  # noqa: PLW0603
+    _worker_args = (extractors, preserveOriginalIn)
+
+
+def _clean_chunk(
+    txns: list[Transaction],
+) -> tuple[list[Transaction], list[datetime.date]]:
+    extractors, preserveOriginalIn = _worker_args
+    cleaned = [TxnPayeeCleanup(t, extractors, preserveOriginalIn) for t in txns]
+    return cleaned, [e.last_used for e in extractors or ()]
+
+
+def TxnPayeeCleanupBatch(
+    txns: Iterable[Transaction],
+    extractors: Extractors | None = None,
+    preserveOriginalIn: str | None = None,
+    workers: int = 1,
+) -> list[Transaction]:
+    """Apply TxnPayeeCleanup to all txns, using up to workers processes.
+
+    Workers are forked, so they share the extractors with this process instead
+    of getting pickled copies of them; their last_used dates are brought back
+    here once they're done. Each of them gets at least BATCH_CHUNK_SIZE txns;
+    smaller batches, a single worker or a platform other than Linux, where
+    forking isn't safe, mean the work is done in this process.
+    """
+    txns = list(txns)
+    workers = min(workers, len(txns) // BATCH_CHUNK_SIZE)
+    if extractors is None or workers <= 1 or sys.platform != 'linux':
+        return [
+            TxnPayeeCleanup(t, extractors, preserveOriginalIn) for t in txns
+        ]
+    size = -(-len(txns) // workers)
+    chunks = [txns[i : i + size] for i in range(0, len(txns), size)]
+    with multiprocessing.get_context('fork').Pool(
+        workers,
+        _init_worker,
+        (extractors, preserveOriginalIn),
+    ) as pool:
+        results = pool.map(_clean_chunk, chunks)
+    for _, used in results:
+        for extractor, last_used in zip(extractors, used, strict=True):
+            extractor.last_used = max(last_used, extractor.last_used)
+    return [txn for cleaned, _ in results for txn in cleaned]
+
+
+@dataclass(frozen=True, slots=True)
+class ExtractorUsage:
     """Structure for usage reporting of a single extractor."""
 
     date: datetime.date
     rulename: str
 
     def __str__(self) -> str:  # noqa: D105
-        return f'{self.date.strftime("%Y-%m-%d")}: {self.rulename}'
+        return f'{self.date.isoformat()}: {self.rulename}'
 
 
 class ExtractorsUsage(list[ExtractorUsage]):
@@ -168,6 +776,6 @@ def extractorsUsage(extractors: Extractors) -> ExtractorsUsage:
     """For every extractor in the set, reports what was the date of the most recent transaction processed by it."""
     return ExtractorsUsage(
         sorted(
-            [(e.last_used, f'{e.description}') for e in extractors],
+            [(e.last_used, e.description) for e in extractors],
         ),
     )
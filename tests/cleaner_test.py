@@ -1,15 +1,21 @@
 """Tests for the transaction cleaner."""
 
+import copy
 import datetime
+import pickle
 import re
+from dataclasses import FrozenInstanceError
 
 import pytest
 from beancount.core.data import Transaction
 
 from beancount_tx_cleanup.cleaner import (
+    AGES_AGO,
+    BATCH_CHUNK_SIZE,
     Action,
     C,
     E,
+    Extraction,
     Extractor,
     Extractors,
     M,
@@ -19,6 +25,8 @@ from beancount_tx_cleanup.cleaner import (
     T,
     Tag,
     TxnPayeeCleanup,
+    TxnPayeeCleanupBatch,
+    TxnState,
     extractorsUsage,
 )
 from beancount_tx_cleanup.helpers import Tx
@@ -26,6 +34,9 @@ from beancount_tx_cleanup.utils import make_test_transaction_factory
 
 TESTDATE = datetime.date(2071, 3, 14)
 TTx = make_test_transaction_factory(TESTDATE)
+# tags are frozensets in Transactions; these are shared by the scenarios
+YEN = frozenset({'¥'})
+TASTY = frozenset({'tasty'})
 
 
 class TestActionTypes:
@@ -52,6 +63,67 @@ class TestActionTypes:
         """Test Cleaner action."""
         assert Payee(v='') == C
 
+    def testSharedTranslation(self):
+        """Equal translation tables are shared, and copied from the input."""
+        table = {'jpy': '¥'}
+        t, m = T('t', translation=table), M('m', translation=dict(table))
+        assert t.translation is m.translation
+        table['usd'] = '$'
+        assert t.translation == {'jpy': '¥'}
+        assert copy.deepcopy(t) == t
+        # values are looked up by their lowercase form, whatever the keys are
+        m = re.search('(...)', 'Jpy')
+        assert m is not None
+        assert T(r'\1', translation={'JPY': '¥'}).apply(m) == '¥'
+        # which makes keys differing only in case ambiguous
+        with pytest.raises(ValueError, match='differ only in case'):
+            T('t', translation={'AB': 'up', 'ab': 'low'})
+        with pytest.raises(TypeError):
+            t.translation['jpy'] = 'x'  # pyright: ignore[reportIndexIssue]
+        assert T('t', translation={'jpy': '¥'}).translation == {'jpy': '¥'}
+        assert pickle.loads(pickle.dumps(t)) == t
+
+    def test_frozen(self):
+        """Actions can't be changed once they're made."""
+        t = T(r'\1')
+        with pytest.raises(FrozenInstanceError):
+            t.v = r'x-\1'  # pyright: ignore[reportAttributeAccessIssue]
+        m = re.search('(ab)', 'ab')
+        assert m is not None
+        assert t.apply(m) == 'ab'
+        assert copy.deepcopy(M('n')) == pickle.loads(pickle.dumps(M('n')))
+
+    def test_payee_count(self):
+        """Payee rewrites as many matches as it's told there can be."""
+        m = re.search('ab', 'ab ab')
+        assert m is not None
+        state = TxnState('ab ab', set(), {})
+        Payee(v='x').update(m, state, 1)
+        assert state.payee == 'x ab'
+        Payee(v='x').update(m, state)
+        assert state.payee == 'x x'
+
+    @pytest.mark.parametrize(
+        'v',
+        [r'\1', r'\g<1>', r'\g<0>', r'\g<code>', r'\2', 'literal', r'\1-\2'],
+    )
+    def testApplyTemplates(self, v):
+        """Action.apply expands templates the same way Match.expand does."""
+        m = re.search(r'(?P<code>[A-Z]+) ?(\d+)?', ' ABC ')
+        assert m is not None
+        assert T(v).apply(m) == m.expand(v).strip()
+
+    def testExecute(self):
+        """Actions can be applied to a transaction directly."""
+        m = re.search(r'(\d+)', 'shop 42')
+        assert m is not None
+        tx = TTx('shop 42', meta={'n': '1'})
+        assert TTx('shop', meta={'n': '1'}) == C.execute(m, tx)
+        assert TTx('shop 42', meta={'n': '1, 42'}) == M('n').execute(m, tx)
+        tagged = TTx('shop 42', meta={'n': '1'}, tags={'42'})
+        assert tagged == T(r'\1').execute(m, tx)
+        assert tx == TTx('shop 42', meta={'n': '1'})
+
 
 class TestExtractorAndExtractors:
     """Extractor(s) related tests."""
@@ -61,15 +133,27 @@ class TestExtractorAndExtractors:
         # Test with string regex and single Action
         extractor = E('digit eraser', r'^\d+', C)
         assert isinstance(extractor.r, re.Pattern)
-        assert isinstance(extractor.actions, list)
+        assert isinstance(extractor.actions, tuple)
         assert extractor.description == 'digit eraser'
 
         # Test with compiled regex and list of Actions
         extractor = E('digit extractor', re.compile(r'\d+'), [M('digits'), C])
         assert isinstance(extractor.r, re.Pattern)
-        assert isinstance(extractor.actions, list)
+        assert isinstance(extractor.actions, tuple)
         assert extractor.description == 'digit extractor'
 
+    def test_extractor_frozen(self):
+        """Only last_used of an Extractor can change once it's created."""
+        extractor = E('cleaner', r'foo', C)
+        with pytest.raises(AttributeError):
+            extractor.actions.append(T('t'))  # pyright: ignore[reportAttributeAccessIssue]
+        with pytest.raises(FrozenInstanceError):
+            extractor.r = re.compile('bar')
+        extractor.last_used = TESTDATE
+        assert extractor.last_used == TESTDATE
+        assert copy.deepcopy(extractor) == extractor
+        assert pickle.loads(pickle.dumps(extractor)) == extractor
+
     def test_extractors(self):
         """Test Extractors creation and addition."""
         exs = Extractors(
@@ -85,6 +169,151 @@ class TestExtractorAndExtractors:
         assert len(exs) == 4  # noqa: PLR2004
         assert all(isinstance(x, Extractor) for x in exs)
 
+    def test_union(self):
+        """Test the combined pattern of an Extractors list."""
+        exs = Extractors(
+            [
+                E('id', r'(?i)^(ID\d+)', C),
+                E('multiline', re.compile(r'^end$', re.MULTILINE), C),
+                E('verbose', r'(?x) @ \s (\d+)  # price', C),
+            ],
+        )
+        union = exs.union()
+        assert union is not None
+        # flags of every pattern still apply, but only to that pattern
+        assert union.search('id123 abc')
+        assert union.search('abc\nend')
+        assert union.search('abc @ 12')
+        assert not union.search('abc ID123')
+        assert not union.search('abc END')
+        assert not exs.extract('abc ID123').extractors
+        # the union follows changes to the list
+        exs += E('suffix', r'ID\d+$', C)
+        assert exs.extract('abc ID123').extractors
+        # equal sets of patterns share their union
+        same = Extractors(
+            [E('', re.compile(e.r.pattern, e.r.flags), C) for e in exs],
+        )
+        exs.precompile()
+        assert same.union() is exs.union()
+
+    def test_extraction_cache(self):
+        """Results for a payee are reused until the extractors change."""
+        exs = Extractors([E('id', r'^(ID\d+)', [M('id'), C])])
+        first = exs.extract('ID1 shop')
+        assert first == Extraction(
+            'shop',
+            frozenset(),
+            (('id', 'ID1'),),
+            (exs[0],),
+        )
+        assert exs.extract('ID1 shop') is first
+        exs += E('tag', r'shop', T('shopping'))
+        second = exs.extract('ID1 shop')
+        assert second.tags == {'shopping'}
+        assert second.extractors == tuple(exs)
+
+    @pytest.mark.parametrize(
+        'change',
+        [
+            lambda exs, e: exs.append(e),
+            lambda exs, e: exs.extend([e]),
+            lambda exs, e: exs.insert(0, e),
+            lambda exs, e: exs.__setitem__(slice(0, 0), [e]),
+            lambda exs, e: exs.__imul__(1) and exs.append(e),
+        ],
+    )
+    def test_extraction_cache_changes(self, change):
+        """Every change of the list makes it drop the cached results."""
+        exs = Extractors([E('id', r'^(ID\d+)', [M('id'), C])])
+        assert exs.extract('ID1 shop').tags == frozenset()
+        tag = E('tag', r'shop', T('shopping'))
+        change(exs, tag)
+        assert exs.extract('ID1 shop').tags == {'shopping'}
+        exs.remove(tag)
+        assert exs.extract('ID1 shop').tags == frozenset()
+        exs.pop()
+        assert exs.extract('ID1 shop') == Extraction('ID1 shop')
+
+    def test_extraction_cache_identity(self):
+        """An equal, but different extractor doesn't get the cached results."""
+        exs = Extractors([E('id', r'^(ID\d+)', [M('id'), C])])
+        old = exs[0]
+        exs.extract('ID1 shop')
+        exs[0] = E('id', r'^(ID\d+)', [M('id'), C])
+        assert exs[0] == old
+        TxnPayeeCleanup(TTx('ID1 shop'), exs)
+        assert exs.extract('ID1 shop').extractors[0] is exs[0]
+        assert exs[0].last_used == TESTDATE
+        assert old.last_used == AGES_AGO
+
+    def test_required_strings(self):
+        """Extractors are checked against the payee as earlier ones left it."""
+        exs = Extractors(
+            [
+                E('expand', r'^ACME$', P('ACME Ltd.')),
+                E('ltd', r' Ltd\.', [T('ltd'), C]),
+            ],
+        )
+        assert [e.required for e in exs] == ['ACME', ' Ltd.']
+        assert exs.extract('ACME') == Extraction(
+            'ACME',
+            frozenset({'ltd'}),
+            (),
+            tuple(exs),
+        )
+
+    def test_no_parser(self, monkeypatch):
+        """Extractors work without the hints, if patterns can't be analysed."""
+        monkeypatch.setattr('beancount_tx_cleanup.cleaner._parser', None)
+        exs = Extractors([E('id', r'^(ID\d+)', [M('id'), C])])
+        assert exs[0].required == ''
+        assert exs.extract('ID1 shop').meta == (('id', 'ID1'),)
+        assert exs.extract('shop').meta == ()
+
+    def test_search_position(self):
+        """Searches starting where the union matched still see the whole payee."""
+        exs = Extractors(
+            [
+                E('behind', r'(?<=x)y', T('y')),
+                E('boundary', r'\bz', T('z')),
+                E('start', r'^x', T('x')),
+            ],
+        )
+        assert exs.extract('-xy z').tags == {'y', 'z'}
+
+    def test_copy(self):
+        """Copies of Extractors are Extractors, independent of the original."""
+        exs = Extractors([E('id', r'^(ID\d+)', [M('id'), C])])
+        other = exs.copy()
+        assert isinstance(other, Extractors)
+        assert other.union() is exs.union()
+        assert other.extract('ID1 shop') is exs.extract('ID1 shop')
+        other += E('tag', r'shop', T('shopping'))
+        assert other.extract('ID1 shop').tags == {'shopping'}
+        assert exs.extract('ID1 shop').tags == frozenset()
+
+    def test_deepcopy(self):
+        """Deep copies and unpickled Extractors record their own usage."""
+        exs = Extractors([E('id', r'^(ID\d+)', [M('id'), C])])
+        exs.extract('ID1 shop')
+        for other in (copy.deepcopy(exs), pickle.loads(pickle.dumps(exs))):
+            assert isinstance(other, Extractors)
+            assert other == exs
+            assert other[0] is not exs[0]
+            TxnPayeeCleanup(TTx('ID1 shop'), other)
+            assert other[0].last_used == TESTDATE
+            assert exs[0].last_used == AGES_AGO
+
+    def test_no_union(self):
+        """Patterns relying on their group numbers can't be combined."""
+        exs = Extractors([E('double', r'(\d)\1', C), E('any', r'.', C)])
+        assert exs.union() is None
+        assert exs.extract('a').extractors
+        # but payees too short for any of them to match are still skipped
+        assert not exs.extract('').extractors
+        assert Extractors().union() is None
+
 
 @pytest.fixture
 def extractors():
@@ -144,11 +373,11 @@ class TestCleanerFunctionality:
         # extraction with a custom value plus a lambda replacement
         (TTx('GTS98765 regular saver'), TTx('56789 regular saver', meta={'id': 'v-98765'})),
         # extraction to a tag, a lookup table then a cleanup with a string replacement
-        (TTx('AirSide Coffee 12.30 JPY@ 0.13  '), TTx('AirSide Coffee 12.30 JPY (0.13 each)', tags={'¥'})),
+        (TTx('AirSide Coffee 12.30 JPY@ 0.13  '), TTx('AirSide Coffee 12.30 JPY (0.13 each)', tags=YEN)),
         # as above, but the input transaction already has some tags
-        (TTx('AirSide Coffee 12.30 JPY@ 0.13  ', tags={'tasty'}), TTx('AirSide Coffee 12.30 JPY (0.13 each)', tags={'¥', 'tasty'})),
+        (TTx('AirSide Coffee 12.30 JPY@ 0.13  ', tags=TASTY), TTx('AirSide Coffee 12.30 JPY (0.13 each)', tags=YEN | TASTY)),
         # as above, but the input transaction has an exactly identical tag
-        (TTx('AirSide Coffee 12.30 JPY@ 0.13  ', tags={'¥'}), TTx('AirSide Coffee 12.30 JPY (0.13 each)', tags={'¥'})),
+        (TTx('AirSide Coffee 12.30 JPY@ 0.13  ', tags=YEN), TTx('AirSide Coffee 12.30 JPY (0.13 each)', tags=YEN)),
     )  # fmt: skip
 
     @pytest.mark.parametrize(('in_tx', 'out_tx'), CLEANER_SCENARIOS)
@@ -175,6 +404,115 @@ class TestCleanerFunctionality:
             preserveOriginalIn='previously',
         )
 
+    def test_input_untouched(self, extractors):
+        """TxnPayeeCleanup doesn't modify the transaction it's given."""
+        tx = TTx('XY90210 Happy Days', meta={'id': 'Agent 007'}, tags={'a'})
+        _ = TxnPayeeCleanup(tx, extractors, preserveOriginalIn='previously')
+        assert tx == TTx(
+            'XY90210 Happy Days',
+            meta={'id': 'Agent 007'},
+            tags={'a'},
+        )
+
+    def test_meta_ordering(self, extractors):
+        """New metadata keys keep the metadata sorted."""
+        meta = {'z': 'last', 'id': 'Agent 007'}
+        tx = TxnPayeeCleanup(TTx('XY90210 Happy Days', meta=meta), extractors)
+        assert list(tx.meta) == ['z', 'id']
+        tx = TxnPayeeCleanup(
+            TTx('XY90210 Happy Days', meta=meta),
+            extractors,
+            preserveOriginalIn='old',
+        )
+        assert list(tx.meta) == ['id', 'old', 'z']
+
+    def test_repeated_payee(self, extractors):
+        """Transactions with the same payee get the same treatment."""
+        later = datetime.date(2072, 1, 1)
+        _ = TxnPayeeCleanup(TTx('ID1234 standing order'), extractors)
+        tx = TxnPayeeCleanup(
+            Tx(
+                later,
+                'ID1234 standing order',
+                meta={'id': 'x'},
+                tags=frozenset({'a'}),
+            ),
+            extractors,
+        )
+        assert tx == Tx(
+            later,
+            'standing order',
+            meta={'id': 'x, id1234'},
+            tags=frozenset({'a'}),
+        )
+        assert extractors[1].last_used == later
+
+    def test_lone_payee_action(self):
+        """A lone Payee action rewrites every match, just like sub() does."""
+        e = Extractors([E('digit eraser', r'\d', C)])
+        assert TTx('ab c') == TxnPayeeCleanup(TTx('1a2b 3c4'), e)
+        assert e[0].last_used == TESTDATE
+        # nothing but the payee changes, so the rest is shared with the input
+        tx = TTx('1a2b 3c4', meta={'n': '1'}, tags=TASTY)
+        clean = TxnPayeeCleanup(tx, e)
+        assert clean.meta is tx.meta
+        assert clean.tags is tx.tags
+
+    @pytest.mark.parametrize('workers', [1, 3])
+    def test_batch(self, extractors, workers):
+        """A batch gets the same treatment as transactions one by one."""
+        txns = [
+            Tx(TESTDATE + datetime.timedelta(days=i), payee)
+            for i in range(BATCH_CHUNK_SIZE)
+            for payee in ('ID1234 order', 'XY90210 Happy Days', 'Sandworms')
+        ]
+        cleaned = TxnPayeeCleanupBatch(txns, extractors, 'old', workers)
+        assert len(cleaned) == len(txns)
+        assert cleaned[3] == Tx(
+            TESTDATE + datetime.timedelta(days=1),
+            'order',
+            meta={'id': 'id1234', 'old': 'ID1234 order'},
+        )
+        assert cleaned[-1] == txns[-1]
+        last = txns[-1].date
+        assert [e.last_used for e in extractors] == [last] * 2 + [AGES_AGO] * 3
+
+    def test_small_batch(self, extractors, monkeypatch):
+        """Batches too small to share between workers don't start a pool."""
+        monkeypatch.setattr('multiprocessing.get_context', None)
+        txns = [TTx('ID1234 order')] * (2 * BATCH_CHUNK_SIZE - 1)
+        cleaned = TxnPayeeCleanupBatch(txns, extractors, workers=2)
+        assert cleaned == [TTx('order', meta={'id': 'id1234'})] * len(txns)
+
+    @pytest.mark.parametrize(
+        ('r', 'actions', 'out_tx'),
+        [
+            # fixed strings get handled without the regexp engine
+            (r'ACME\ Ltd\.', C, TTx('Wile E. Coyote')),
+            (r'ACME\ Ltd\.', P('ACME'), TTx('ACME Wile E. Coyote')),
+            (r'ACME\ Ltd\.', [T('vendor'), C], TTx('Wile E. Coyote', tags={'vendor'})),
+            (r'ACME\ Ltd\.', P(r'<\g<0>>'), TTx('<ACME Ltd.> Wile E. Coyote')),
+            (r'ACME\ LTD\.', C, TTx('ACME Ltd. Wile E. Coyote')),
+            # these are not fixed strings, but some contain one
+            (r'ACME\sLtd\.', C, TTx('Wile E. Coyote')),
+            (r'(?i)ACME LTD.', C, TTx('Wile E. Coyote')),
+            (r'(?i:acme) Ltd\.', C, TTx('Wile E. Coyote')),
+            (r'(ACME) (?:Ltd|Inc)\.', M('vendor'), TTx('ACME Ltd. Wile E. Coyote', meta={'vendor': 'ACME'})),
+            (r'(ACME) (?:LTD|Inc)\.', M('vendor'), TTx('ACME Ltd. Wile E. Coyote')),
+            # anchored patterns only match at the start
+            (r'^ACME', C, TTx('Ltd. Wile E. Coyote')),
+            (r'(?i)^\w+', C, TTx('Ltd. Wile E. Coyote')),
+            (r'^.*$', [T('all'), C], TTx('', tags={'all'})),
+            (r'^Ltd', C, TTx('ACME Ltd. Wile E. Coyote')),
+            (r'^(ACME) ', [M('vendor'), C], TTx('Ltd. Wile E. Coyote', meta={'vendor': 'ACME'})),
+            (r'\AACME (\w+)\.', T(r'\1'), TTx('ACME Ltd. Wile E. Coyote', tags={'Ltd'})),
+        ],
+    )  # fmt: skip
+    def test_literal_patterns(self, r, actions, out_tx):
+        """Patterns containing fixed strings behave like all the others."""
+        e = Extractors([E('acme', r, actions)])
+        assert out_tx == TxnPayeeCleanup(TTx('ACME Ltd. Wile E. Coyote'), e)
+
     def test_extractor_order_swap(self, extractors):
         """The ordering of extractors is important; in this test we swap the order of applications of  __CLEANUP and TAG_DESTINATION."""
         e: Extractors = extractors.copy()
@@ -182,7 +520,7 @@ class TestCleanerFunctionality:
         tx = TTx('AirSide Coffee 12.30 JPY@ 0.13  ')
         # As a result of the order swap no tag is extracted - by the time TAG_DESTINATION extractor
         # is applied, the string it'd match on has already been cleaned by the __CLEANUP extractor.
-        clean_tx = TTx('AirSide Coffee 12.30 JPY (0.13 each)', tags=set())
+        clean_tx = TTx('AirSide Coffee 12.30 JPY (0.13 each)', tags=frozenset())
         assert clean_tx == TxnPayeeCleanup(tx, e)
 
 